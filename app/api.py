@@ -1,212 +1,305 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from typing import List, Dict, Any
+from fastapi import APIRouter, FastAPI, UploadFile, File, Form, HTTPException, Depends, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from contextlib import asynccontextmanager
+from types import MappingProxyType
+from typing import List, Dict, Any, Awaitable, BinaryIO, Callable, Optional, Tuple, Union
 import pandas as pd
-import io
-import json
-from app.schemas import CaseRequest, CaseResponse, BatchResponse
-from app.logic import verify_combined_case, generate_policy_recommendations
-from app.model_setup import get_chromadb_client, get_openai_client, collections, reset_system, is_mock_mode
+import asyncio
+import logging
+import uuid
+import orjson
+from app.prompts import clinical_regeneration_prompt
+from app.schemas import CaseRequest, CaseResponse, BatchResponse, BatchJobResponse, FieldRegenRequest, ClinicalRegenRequest
+from app.logic import BULLET_RE, verify_combined_case_async, prepare_combined_case, finalize_combined_case, generate_policy_recommendations_async, clear_case_cache
+from app.batching import batcher
+from app.model_setup import (
+    get_chromadb_client, get_openai_client, get_async_openai_client, collections, reset_system, is_mock_mode, ensure_initialized,
+    submit_chat_batch, get_chat_batch, get_chat_batch_outputs
+)
 import os
 
-router = APIRouter()
+logger = logging.getLogger("insure.api")
+
+class ErrorHandlingRoute(APIRoute):
+    """
+    Route that logs any exception its endpoint did not handle and turns it
+    into a 500 response, so endpoints need no catch-all try/except. Unlike an
+    app-level Exception handler this runs inside the middleware stack, so
+    error responses still carry CORS headers.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Awaitable[Response]]:
+        route_handler = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            try:
+                return await route_handler(request)
+            except (StarletteHTTPException, RequestValidationError):
+                raise
+            except Exception as e:
+                logger.exception("Error handling %s %s", request.method, request.url.path)
+                return JSONResponse(status_code=500, content={"detail": f"Error: {str(e)}"})
+
+        return handler
+
+router = APIRouter(route_class=ErrorHandlingRoute)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background services used by the API routes"""
+    # Build the pooled OpenAI clients once, before the first request needs them
+    await asyncio.to_thread(get_async_openai_client)
+    # Load the policy collections before the first case is verified
+    await asyncio.to_thread(ensure_initialized)
+    batcher.start()
+    yield
+    await batcher.stop()
+
+# Maximum number of CSV rows verified concurrently (each row is I/O-bound on OpenAI/ChromaDB)
+CSV_CONCURRENCY = int(os.getenv("CSV_CONCURRENCY", "16"))
+
+# Uploads with more rows than this are sent to the OpenAI Batch API (0 disables)
+BATCH_API_ROW_THRESHOLD = int(os.getenv("BATCH_API_ROW_THRESHOLD", "50"))
+
+# Directory holding the prepared cases of submitted batches
+BATCH_DIR = os.getenv("BATCH_DIR", "batches")
+
+# Directory holding the append-only JSONL checkpoints of /verify-csv-job runs
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs")
+
+# Parse uploads with PyArrow (CSV) and calamine (Excel) instead of the default pandas readers
+INSURE_FAST_IO = os.getenv("INSURE_FAST_IO", "0") == "1"
+
+# Map CSV columns to expected fields - Updated for user's exact format
+FIELD_MAPPING = MappingProxyType({
+    # User's exact column names
+    'chief_complaints': 'complaint',
+    'symptoms': 'symptoms', 
+    'diagnosis_description': 'diagnosis',
+    'service_detail': 'lab',  # Lab details are in service_detail
+    'payer_product_category_name': 'pharmacy',  # Pharmacy details are in payer_product_category_name
+
+    # Alternative column names (fallback)
+    'chief_complaint': 'complaint',
+    'complaints': 'complaint',
+    'symptom': 'symptoms',
+    'diagnosis': 'diagnosis',
+    'diagnosis_code': 'diagnosis',
+    'lab': 'lab',
+    'lab_test': 'lab',
+    'pharmacy': 'pharmacy',
+    'medication': 'pharmacy',
+    'drug': 'pharmacy'
+})
+
+# Upload file types accepted by the CSV endpoints
+EXT_ALLOWED = frozenset({'.csv', '.xlsx', '.xls'})
+
+# Case fields every uploaded row is reduced to
+REQUIRED_COLUMNS = ('complaint', 'symptoms', 'diagnosis', 'lab', 'pharmacy')
+
+def _upload_extension(file: UploadFile) -> str:
+    """Return the lowercased extension of an upload, rejecting unsupported file types"""
+    ext = os.path.splitext(file.filename or '')[1].lower()
+    if ext not in EXT_ALLOWED:
+        raise HTTPException(status_code=400, detail="Only CSV and Excel files are accepted")
+    return ext
+
+def _read_upload(ext: str, source: BinaryIO) -> pd.DataFrame:
+    """Parse an uploaded CSV or Excel file object into a DataFrame"""
+    if ext == '.csv':
+        if INSURE_FAST_IO:
+            # Arrow reads the file in blocks, skipping the intermediate str copy
+            import pyarrow.csv as pacsv
+            table = pacsv.read_csv(source)
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+        # Read CSV
+        return pd.read_csv(source, encoding='utf-8')
+    # Read Excel
+    return pd.read_excel(source, engine="calamine" if INSURE_FAST_IO else None)
+
+def _case_fields(row: Dict[str, str]) -> Dict[str, str]:
+    """Extract the five clinical fields of a CSV row record"""
+    return {col: row[col] for col in REQUIRED_COLUMNS}
+
+def _row_key(row: Dict[str, str]) -> Tuple[str, ...]:
+    """Key identifying rows with the same five case fields"""
+    return tuple(row[col] for col in REQUIRED_COLUMNS)
 
 @router.post("/verify-case", response_model=CaseResponse)
 async def verify_single_case(case: CaseRequest):
     """
     Verify a single insurance case against policy exclusions
     """
-    try:
-        # Verify the case
-        result = verify_combined_case(
-            complaint=case.complaint,
-            symptoms=case.symptoms,
-            diagnosis=case.diagnosis,
-            lab=case.lab,
-            pharmacy=case.pharmacy
-        )
-        
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing case: {str(e)}")
+    # Verify the case, coalesced with concurrent requests
+    result = await batcher.process_batched(case)
+    
+    # Serialized directly: returning the model would make FastAPI re-validate it
+    # against response_model and walk it through jsonable_encoder first
+    return Response(content=result.model_dump_json(), media_type="application/json")
 
 @router.post("/regenerate-field-recommendations")
-async def regenerate_field_recommendations(request: Dict[str, Any]):
+async def regenerate_field_recommendations(request: FieldRegenRequest):
     """
     Regenerate policy-based recommendations for a specific excluded field
     """
-    try:
-        field_name = request.get("field_name")
-        value = request.get("value")
-        explanation = request.get("explanation")
-        policy_source = request.get("policy_source", "Policy")
-        
-        if not all([field_name, value, explanation]):
-            raise HTTPException(status_code=400, detail="Missing required fields: field_name, value, explanation")
-        
-        print(f"🔄 Regenerating recommendations for {field_name}: {value}")
-        
-        # Extract diagnosis context if available
-        diagnosis = request.get("diagnosis", "")
-        complaint = request.get("complaint", "")
-        symptoms = request.get("symptoms", "")
-        
-        # Generate new diagnosis-aware recommendations
-        new_recommendations = generate_policy_recommendations(
-            field_name=field_name,
-            value=value,
-            explanation=explanation,
-            policy_source=policy_source,
-            diagnosis=diagnosis,
-            complaint=complaint,
-            symptoms=symptoms
-        )
-        
-        print(f"✅ Generated {len(new_recommendations)} new recommendations")
-        
-        return {
-            "field_name": field_name,
-            "value": value,
-            "recommendations": new_recommendations
-        }
-        
-    except Exception as e:
-        print(f"Error regenerating field recommendations: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error regenerating recommendations: {str(e)}")
+    field_name = request.field_name
+    value = request.value
+    
+    logger.info("🔄 Regenerating recommendations for %s: %s", field_name, value)
+    
+    # Generate new diagnosis-aware recommendations
+    new_recommendations = await generate_policy_recommendations_async(
+        field_name=field_name,
+        value=value,
+        explanation=request.explanation,
+        policy_source=request.policy_source,
+        diagnosis=request.diagnosis,
+        complaint=request.complaint,
+        symptoms=request.symptoms
+    )
+    
+    logger.info("✅ Generated %d new recommendations", len(new_recommendations))
+    
+    return {
+        "field_name": field_name,
+        "value": value,
+        "recommendations": new_recommendations
+    }
+
+def _append_recommendation(recommendations: List[str], line: str) -> None:
+    """Append the text of a "- " bullet line to recommendations"""
+    match = BULLET_RE.match(line)
+    if match:
+        recommendations.append(match.group(1))
 
 @router.post("/regenerate-clinical-recommendations")
-async def regenerate_clinical_recommendations(request: Dict[str, Any]):
+async def regenerate_clinical_recommendations(request: ClinicalRegenRequest):
     """
     Regenerate clinical logic recommendations for medical coherence issues
     """
+    diagnosis = request.diagnosis
+    complaint = request.complaint
+    symptoms = request.symptoms
+    lab = request.lab
+    pharmacy = request.pharmacy
+    flagged_field = request.flagged_field
+    flagged_item = request.flagged_item
+    
+    logger.info("🔄 Regenerating clinical recommendations for %s: %s", flagged_field, flagged_item)
+    
+    # Get OpenAI client
+    llm_client = await asyncio.to_thread(get_async_openai_client)
+    if not llm_client:
+        # Return mock recommendations if OpenAI not available
+        mock_recommendations = [
+            f"Document medical necessity for {flagged_item}",
+            f"Consider alternative {flagged_field} options that align with diagnosis"
+        ]
+        return {
+            "flagged_field": flagged_field,
+            "flagged_item": flagged_item,
+            "recommendations": mock_recommendations
+        }
+    
+    # Generate fresh clinical recommendations using LLM
+    regeneration_prompt = clinical_regeneration_prompt.format(
+        diagnosis=diagnosis,
+        complaint=complaint,
+        symptoms=symptoms,
+        lab=lab,
+        pharmacy=pharmacy,
+        flagged_field=flagged_field,
+        flagged_item=flagged_item
+    )
+    
     try:
-        diagnosis = request.get("diagnosis", "")
-        complaint = request.get("complaint", "")
-        symptoms = request.get("symptoms", "")
-        lab = request.get("lab", "")
-        pharmacy = request.get("pharmacy", "")
-        flagged_field = request.get("flagged_field")
-        flagged_item = request.get("flagged_item")
-        
-        if not flagged_field or not flagged_item:
-            raise HTTPException(status_code=400, detail="Missing required fields: flagged_field, flagged_item")
+        stream = await llm_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": regeneration_prompt}],
+            temperature=0.3,  # Slight randomness for variety
+            stream=True
+        )
         
-        print(f"🔄 Regenerating clinical recommendations for {flagged_field}: {flagged_item}")
+        # Parse "- " recommendation lines as they arrive and stop once we have two
+        recommendations = []
+        buffer = ""
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                buffer += chunk.choices[0].delta.content or ""
+                while "\n" in buffer and len(recommendations) < 2:
+                    line, buffer = buffer.split("\n", 1)
+                    _append_recommendation(recommendations, line)
+                if len(recommendations) >= 2:
+                    break
+            else:
+                _append_recommendation(recommendations, buffer)
+        finally:
+            await stream.close()
         
-        # Get OpenAI client
-        llm_client = get_openai_client()
-        if not llm_client:
-            # Return mock recommendations if OpenAI not available
-            mock_recommendations = [
+        # Ensure we have at least some recommendations
+        if not recommendations:
+            recommendations = [
                 f"Document medical necessity for {flagged_item}",
                 f"Consider alternative {flagged_field} options that align with diagnosis"
             ]
-            return {
-                "flagged_field": flagged_field,
-                "flagged_item": flagged_item,
-                "recommendations": mock_recommendations
-            }
         
-        # Generate fresh clinical recommendations using LLM
-        regeneration_prompt = f"""
-You are a senior clinical pharmacist providing alternative recommendations for a medical logic inconsistency.
-
-CLINICAL CONTEXT:
-- Diagnosis: {diagnosis}
-- Chief Complaint: {complaint}
-- Symptoms: {symptoms}
-- Lab Tests: {lab}
-- Prescribed Medication: {pharmacy}
-
-IDENTIFIED ISSUE:
-- Flagged Field: {flagged_field}
-- Problematic Item: {flagged_item}
-
-TASK:
-Generate 2 NEW alternative recommendations to resolve this clinical inconsistency. 
-Focus on practical, actionable steps that would improve the medical appropriateness.
-
-EXAMPLE OUTPUT FORMAT:
-- [Alternative recommendation 1]
-- [Alternative recommendation 2]
-
-Provide ONLY the recommendations, one per line, starting with "- ".
-"""
+        logger.info("✅ Generated %d new clinical recommendations", len(recommendations))
         
-        try:
-            response = llm_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": regeneration_prompt}],
-                temperature=0.3  # Slight randomness for variety
-            )
-            
-            clinical_result = response.choices[0].message.content.strip()
-            
-            # Parse recommendations
-            recommendations = []
-            for line in clinical_result.split('\n'):
-                line = line.strip()
-                if line.startswith('- '):
-                    rec = line.replace('- ', '').strip()
-                    if rec:
-                        recommendations.append(rec)
-            
-            # Ensure we have at least some recommendations
-            if not recommendations:
-                recommendations = [
-                    f"Document medical necessity for {flagged_item}",
-                    f"Consider alternative {flagged_field} options that align with diagnosis"
-                ]
-            
-            print(f"✅ Generated {len(recommendations)} new clinical recommendations")
-            
-            return {
-                "flagged_field": flagged_field,
-                "flagged_item": flagged_item,
-                "recommendations": recommendations
-            }
-            
-        except Exception as llm_error:
-            print(f"LLM error, using fallback: {llm_error}")
-            # Fallback recommendations
-            fallback_recommendations = [
-                f"Document medical necessity for {flagged_item}",
-                f"Consider alternative {flagged_field} options that align with diagnosis"
-            ]
-            return {
-                "flagged_field": flagged_field,
-                "flagged_item": flagged_item,
-                "recommendations": fallback_recommendations
-            }
+        return {
+            "flagged_field": flagged_field,
+            "flagged_item": flagged_item,
+            "recommendations": recommendations
+        }
         
-    except Exception as e:
-        print(f"Error regenerating clinical recommendations: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error regenerating clinical recommendations: {str(e)}")
+    except Exception as llm_error:
+        logger.warning("LLM error, using fallback: %s", llm_error)
+        # Fallback recommendations
+        fallback_recommendations = [
+            f"Document medical necessity for {flagged_item}",
+            f"Consider alternative {flagged_field} options that align with diagnosis"
+        ]
+        return {
+            "flagged_field": flagged_field,
+            "flagged_item": flagged_item,
+            "recommendations": fallback_recommendations
+        }
 
 @router.post("/reset-system")
 async def reset_system_endpoint():
     """
     Reset system to force re-check of API availability and clear mock mode
     """
-    try:
-        # Reset the system
-        reset_system()
-        
-        # Check if API is now available
-        llm_client = get_openai_client()
-        
-        # Get current status
-        mock_mode = is_mock_mode()
-        api_available = llm_client is not None
-        
-        return {
-            "message": "System reset completed",
-            "mock_mode": mock_mode,
-            "api_available": api_available,
-            "status": "success"
-        }
-    except Exception as e:
-        print(f"Error resetting system: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error resetting system: {str(e)}")
+    # Reset the system and drop responses cached under the previous mode
+    reset_system()
+    clear_case_cache()
+    
+    # Check if API is now available
+    llm_client = await asyncio.to_thread(get_openai_client)
+    
+    # Get current status
+    mock_mode = is_mock_mode()
+    api_available = llm_client is not None
+    
+    return {
+        "message": "System reset completed",
+        "mock_mode": mock_mode,
+        "api_available": api_available,
+        "status": "success"
+    }
+
+@router.post("/clear-cache")
+async def clear_cache_endpoint():
+    """
+    Drop cached case responses, LLM classifications, embeddings and policy matrices
+    """
+    clear_case_cache()
+    return {"message": "Caches cleared", "status": "success"}
 
 @router.get("/system-status")
 async def get_system_status():
@@ -215,7 +308,7 @@ async def get_system_status():
     """
     try:
         mock_mode = is_mock_mode()
-        llm_client = get_openai_client()
+        llm_client = await asyncio.to_thread(get_openai_client)
         api_available = llm_client is not None
         
         return {
@@ -232,101 +325,356 @@ async def get_system_status():
             "status": "error"
         }
 
-@router.post("/verify-csv", response_model=BatchResponse)
+async def _load_upload_rows(ext: str, file: UploadFile) -> Tuple[List[Any], List[Dict[str, str]]]:
+    """
+    Parse an uploaded CSV/Excel file into case ids and plain dict row records
+    holding the required case fields
+    """
+    # Parse straight from the upload's spooled temp file (kept in memory up
+    # to a small threshold, on disk beyond it) instead of reading it into bytes
+    await file.seek(0)
+    df = await asyncio.to_thread(_read_upload, ext, file.file)
+    
+    logger.info("Received file with %d rows", len(df))
+    
+    # Rename columns according to mapping
+    df = df.rename(columns={k: v for k, v in FIELD_MAPPING.items() if k in df.columns})
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("After mapping, columns are: %s", df.columns.tolist())
+    
+    # Ensure required columns exist
+    for col in REQUIRED_COLUMNS:
+        if col not in df.columns:
+            df[col] = ''
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Final columns: %s", df.columns.tolist())
+    
+    # Case ids are resolved column-wise: id, else case_id, else the 1-based row number.
+    # tolist() keeps them as native Python values (a numeric id column stays numeric);
+    # only missing cells fall back to the row number
+    if 'id' in df.columns:
+        id_column = df['id']
+    elif 'case_id' in df.columns:
+        id_column = df['case_id']
+    else:
+        id_column = None
+    if id_column is None:
+        case_ids = list(range(1, len(df) + 1))
+    else:
+        case_ids = [
+            row_number if missing else case_id
+            for row_number, (case_id, missing) in enumerate(zip(id_column.tolist(), id_column.isna().tolist()), start=1)
+        ]
+    
+    # Plain dicts of exactly the five str fields, no per-row pandas Series or .get() defaults
+    rows = (
+        df[list(REQUIRED_COLUMNS)]
+        .astype(object)
+        .fillna('')
+        .astype(str)
+        .to_dict(orient='records')
+    )
+    return case_ids, rows
+
+async def _verify_row(semaphore: asyncio.Semaphore, case_id: Any, row: Dict[str, str]) -> CaseResponse:
+    """Verify one CSV row, bounded by the shared semaphore"""
+    async with semaphore:
+        logger.debug("Processing case %s", case_id)
+        
+        return await verify_combined_case_async(**_case_fields(row))
+
+def _batch_response(results: List[Dict[str, Any]]) -> Response:
+    """Serialize verified cases as a BatchResponse in one pass of pydantic's Rust serializer"""
+    batch = BatchResponse(results=results, total_processed=len(results))
+    return Response(content=batch.model_dump_json(), media_type="application/json")
+
+@router.post("/verify-csv", response_model=Union[BatchResponse, BatchJobResponse])
 async def verify_csv_cases(file: UploadFile = File(...)):
     """
     Process a CSV or Excel file with multiple insurance cases
     """
-    filename = file.filename.lower()
-    if not (filename.endswith('.csv') or filename.endswith('.xlsx') or filename.endswith('.xls')):
-        raise HTTPException(status_code=400, detail="Only CSV and Excel files are accepted")
+    ext = _upload_extension(file)
     
-    try:
-        # Read file content
-        contents = await file.read()
-        
-        if filename.endswith('.csv'):
-            # Read CSV
-            df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-        else:
-            # Read Excel
-            df = pd.read_excel(io.BytesIO(contents))
-        
-        print(f"Received file with {len(df)} rows and columns: {df.columns.tolist()}")
-        
-        # Map CSV columns to expected fields - Updated for user's exact format
-        field_mapping = {
-            # User's exact column names
-            'chief_complaints': 'complaint',
-            'symptoms': 'symptoms', 
-            'diagnosis_description': 'diagnosis',
-            'service_detail': 'lab',  # Lab details are in service_detail
-            'payer_product_category_name': 'pharmacy',  # Pharmacy details are in payer_product_category_name
-            
-            # Alternative column names (fallback)
-            'chief_complaint': 'complaint',
-            'complaints': 'complaint',
-            'symptom': 'symptoms',
-            'diagnosis': 'diagnosis',
-            'diagnosis_code': 'diagnosis',
-            'lab': 'lab',
-            'lab_test': 'lab',
-            'pharmacy': 'pharmacy',
-            'medication': 'pharmacy',
-            'drug': 'pharmacy'
-        }
-        
-        # Rename columns according to mapping
-        df = df.rename(columns={k: v for k, v in field_mapping.items() if k in df.columns})
-        
-        print(f"After mapping, columns are: {df.columns.tolist()}")
-        
-        # Ensure required columns exist
-        required_columns = ['complaint', 'symptoms', 'diagnosis', 'lab', 'pharmacy']
-        for col in required_columns:
-            if col not in df.columns:
-                df[col] = ''
-        
-        print(f"Final columns: {df.columns.tolist()}")
-        print(f"Sample data preview:")
-        print(df[['complaint', 'symptoms', 'diagnosis', 'lab', 'pharmacy']].head().to_string())
+    case_ids, rows = await _load_upload_rows(ext, file)
+    
+    # Large uploads are submitted to the OpenAI Batch API and collected via /batch-status
+    if (BATCH_API_ROW_THRESHOLD and len(rows) > BATCH_API_ROW_THRESHOLD and not is_mock_mode()
+            and await asyncio.to_thread(get_openai_client) is not None):
+        return await _submit_csv_batch(case_ids, rows)
+    
+    # Identical rows (same five fields) are verified once and the result shared
+    unique_rows = {}
+    for case_id, row in zip(case_ids, rows):
+        unique_rows.setdefault(_row_key(row), (case_id, row))
+    
+    # Process unique rows concurrently, bounded by CSV_CONCURRENCY
+    semaphore = asyncio.Semaphore(CSV_CONCURRENCY)
+    unique_outcomes = await asyncio.gather(
+        *[_verify_row(semaphore, case_id, row) for case_id, row in unique_rows.values()],
+        return_exceptions=True
+    )
+    outcome_by_key = dict(zip(unique_rows, unique_outcomes))
+    logger.info("Verified %d unique cases for %d rows", len(unique_rows), len(rows))
+    
+    results = []
+    for case_id, row in zip(case_ids, rows):
+        outcome = outcome_by_key[_row_key(row)]
+        if isinstance(outcome, Exception):
+            logger.error("Error processing case %s: %s", case_id, outcome)
+            results.append({
+                'case_id': case_id,
+                'error': str(outcome)
+            })
+            continue
         
-        # Process each row
-        results = []
-        for idx, row in df.iterrows():
+        results.append({
+            'case_id': case_id,
+            'result': outcome
+        })
+        logger.debug("Case %s: %s with probability %s%%", case_id, outcome.final_decision, outcome.approval_probability)
+    
+    logger.info("Completed processing %d cases", len(results))
+    return _batch_response(results)
+
+@router.post("/verify-csv-stream")
+async def verify_csv_cases_stream(file: UploadFile = File(...)):
+    """
+    Process a CSV or Excel file and stream each case as newline-delimited JSON
+    as soon as it is verified (in completion order, not file order)
+    """
+    ext = _upload_extension(file)
+    
+    case_ids, rows = await _load_upload_rows(ext, file)
+    
+    semaphore = asyncio.Semaphore(CSV_CONCURRENCY)
+    
+    async def _verify_tagged(case_id, row):
+        try:
+            return {'case_id': case_id, 'result': (await _verify_row(semaphore, case_id, row)).model_dump()}
+        except Exception as e:
+            logger.error("Error processing case %s: %s", case_id, e)
+            return {'case_id': case_id, 'error': str(e)}
+    
+    async def _generate():
+        tasks = [asyncio.create_task(_verify_tagged(case_id, row)) for case_id, row in zip(case_ids, rows)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield orjson.dumps(await next_done) + b"\n"
+            logger.info("Completed processing %d cases", len(tasks))
+        finally:
+            # Client disconnected mid-stream, stop verifying the remaining rows
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(_generate(), media_type="application/x-ndjson")
+
+# Running checkpointed jobs by job_id (also keeps their tasks referenced)
+_running_jobs: Dict[str, asyncio.Task] = {}
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{os.path.basename(job_id)}.jsonl")
+
+def _read_job_records(job_id: str) -> List[Dict[str, Any]]:
+    """Load the completed case records of a job checkpoint"""
+    path = _job_path(job_id)
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
             try:
-                # Generate a case ID if not present
-                case_id = row.get('id', row.get('case_id', idx + 1))
-                
-                # Log processing
-                print(f"Processing case {case_id}")
-                
-                result = verify_combined_case(
-                    complaint=str(row.get('complaint', '')),
-                    symptoms=str(row.get('symptoms', '')),
-                    diagnosis=str(row.get('diagnosis', '')),
-                    lab=str(row.get('lab', '')),
-                    pharmacy=str(row.get('pharmacy', ''))
-                )
-                
-                results.append({
-                    'case_id': case_id,
-                    'result': result
-                })
-                
-                # Log result
-                print(f"Case {case_id}: {result.final_decision} with probability {result.approval_probability}%")
-                
+                records.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                # Partial last line from an interrupted write, that case is redone
+                continue
+    return records
+
+def _record_key(record: Dict[str, Any]) -> Any:
+    """Row position of a job record (checkpoints written before positions were recorded key on case_id)"""
+    return record.get('row', record['case_id'])
+
+def _restart_job(job_id: str) -> List[Dict[str, Any]]:
+    """Clear the completion marker of a job and return the records already checkpointed"""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    if os.path.exists(_job_path(job_id) + ".done"):
+        os.remove(_job_path(job_id) + ".done")
+    return _read_job_records(job_id)
+
+def _mark_job_done(job_id: str) -> None:
+    # Marker telling /jobs that the run finished rather than being interrupted
+    open(_job_path(job_id) + ".done", "w").close()
+
+async def _run_checkpointed_job(job_id: str, case_ids: List[Any], rows: List[Dict[str, str]]) -> None:
+    """Verify every row not yet in the job checkpoint, appending each result as it completes"""
+    # Records are keyed on the row position since CSV case ids are not guaranteed unique
+    done = {_record_key(record) for record in await asyncio.to_thread(_restart_job, job_id) if 'result' in record}
+    pending = [
+        (position, case_id, row)
+        for position, (case_id, row) in enumerate(zip(case_ids, rows))
+        if position not in done
+    ]
+    logger.info("Job %s: %d cases already done, %d to process", job_id, len(case_ids) - len(pending), len(pending))
+    
+    semaphore = asyncio.Semaphore(CSV_CONCURRENCY)
+    with open(_job_path(job_id), "a", encoding="utf-8") as f:
+        async def _verify_and_record(position, case_id, row):
+            try:
+                record = {'row': position, 'case_id': case_id, 'result': (await _verify_row(semaphore, case_id, row)).model_dump()}
             except Exception as e:
-                print(f"Error processing case {case_id}: {str(e)}")
-                results.append({
-                    'case_id': case_id,
-                    'error': str(e)
-                })
+                logger.error("Error processing case %s: %s", case_id, e)
+                record = {'row': position, 'case_id': case_id, 'error': str(e)}
+            # Written from the event loop thread, so lines never interleave
+            f.write(orjson.dumps(record).decode() + "\n")
+            f.flush()
         
-        print(f"Completed processing {len(results)} cases")
-        return {"results": results, "total_processed": len(results)}
+        await asyncio.gather(*[_verify_and_record(position, case_id, row) for position, case_id, row in pending])
+    await asyncio.to_thread(_mark_job_done, job_id)
+    logger.info("Job %s: completed", job_id)
+
+@router.post("/verify-csv-job")
+async def start_csv_job(file: UploadFile = File(...), job_id: Optional[str] = Form(None)):
+    """
+    Start a checkpointed CSV/Excel verification job and return its job_id
+    immediately. Re-submitting the same file with the same job_id resumes an
+    interrupted run, skipping cases already recorded in the checkpoint (failed
+    cases are retried).
+    """
+    ext = _upload_extension(file)
     
-    except Exception as e:
-        print(f"Error processing file: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    job_id = os.path.basename(job_id) if job_id else uuid.uuid4().hex
+    if job_id in _running_jobs:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is already running")
+    
+    case_ids, rows = await _load_upload_rows(ext, file)
+    
+    task = asyncio.create_task(_run_checkpointed_job(job_id, case_ids, rows))
+    _running_jobs[job_id] = task
+    task.add_done_callback(lambda _: _running_jobs.pop(job_id, None))
+    return {"job_id": job_id, "status": "running", "total_submitted": len(rows)}
+
+@router.get("/jobs/{job_id}")
+async def get_csv_job(job_id: str):
+    """
+    Return the status of a checkpointed job and the cases it has completed so far
+    """
+    job_id = os.path.basename(job_id)
+    running = job_id in _running_jobs
+    if not running and not os.path.exists(_job_path(job_id)):
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    
+    if running:
+        status = "running"
+    elif os.path.exists(_job_path(job_id) + ".done"):
+        status = "completed"
+    else:
+        # The server stopped mid-run, re-submit the file with this job_id to resume
+        status = "interrupted"
+    
+    # Later records win, so a retried case reports its latest outcome
+    latest = {}
+    for record in await asyncio.to_thread(_read_job_records, job_id):
+        latest[_record_key(record)] = record
+    results = list(latest.values())
+    return {
+        "job_id": job_id,
+        "status": status,
+        "results": results,
+        "total_processed": len(results)
+    }
+
+async def _submit_csv_batch(case_ids: List[Any], rows: List[Dict[str, str]]) -> Union[Dict[str, Any], Response]:
+    """
+    Prepare every row without calling the LLM, then submit all pending
+    LLM requests as one OpenAI batch. The prepared cases are stored under
+    BATCH_DIR so /batch-status can finish them once the batch completes.
+    """
+    semaphore = asyncio.Semaphore(CSV_CONCURRENCY)
+    
+    async def _prepare_row(row):
+        async with semaphore:
+            return await asyncio.to_thread(prepare_combined_case, **_case_fields(row))
+    
+    outcomes = await asyncio.gather(*[_prepare_row(row) for row in rows], return_exceptions=True)
+    
+    cases = []
+    batch_requests = {}
+    for position, (case_id, outcome) in enumerate(zip(case_ids, outcomes)):
+        if isinstance(outcome, Exception):
+            logger.error("Error preparing case %s: %s", case_id, outcome)
+            cases.append({"case_id": case_id, "error": str(outcome)})
+            continue
+        cases.append({"case_id": case_id, "prepared": outcome})
+        # custom_id uses the row position since CSV case ids are not guaranteed unique
+        for key, body in outcome["llm_requests"].items():
+            batch_requests[f"{position}::{key}"] = body
+    
+    if not batch_requests:
+        # Every row was decided by rules, nothing to send to the Batch API
+        results = await _finalize_batch_cases(cases, {})
+        return _batch_response(results)
+    
+    batch = await asyncio.to_thread(submit_chat_batch, batch_requests)
+    
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    with open(os.path.join(BATCH_DIR, f"{batch.id}.json"), "wb") as f:
+        f.write(orjson.dumps({"cases": cases}))
+    
+    logger.info("Submitted batch %s with %d requests for %d cases", batch.id, len(batch_requests), len(cases))
+    return {"batch_id": batch.id, "status": batch.status, "total_submitted": len(cases)}
+
+async def _finalize_batch_cases(cases: List[Dict[str, Any]], batch_outputs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Finish prepared cases using the LLM outputs of their batch"""
+    semaphore = asyncio.Semaphore(CSV_CONCURRENCY)
+    
+    async def _finalize(position, case):
+        prepared = case["prepared"]
+        llm_outputs = {
+            key: batch_outputs.get(f"{position}::{key}", Exception("No batch output for this request"))
+            for key in prepared["llm_requests"]
+        }
+        async with semaphore:
+            return await asyncio.to_thread(finalize_combined_case, prepared, llm_outputs)
+    
+    positions = [position for position, case in enumerate(cases) if "prepared" in case]
+    outcomes = await asyncio.gather(*[_finalize(p, cases[p]) for p in positions], return_exceptions=True)
+    finalized = dict(zip(positions, outcomes))
+    
+    results = []
+    for position, case in enumerate(cases):
+        outcome = finalized.get(position)
+        if outcome is None:
+            results.append({'case_id': case["case_id"], 'error': case["error"]})
+        elif isinstance(outcome, Exception):
+            logger.error("Error processing case %s: %s", case["case_id"], outcome)
+            results.append({'case_id': case["case_id"], 'error': str(outcome)})
+        else:
+            results.append({'case_id': case["case_id"], 'result': outcome})
+    return results
+
+@router.get("/batch-status/{batch_id}", response_model=Union[BatchResponse, BatchJobResponse])
+async def get_batch_status(batch_id: str):
+    """
+    Check an OpenAI batch submitted by /verify-csv and return the verified
+    cases once it has completed
+    """
+    state_path = os.path.join(BATCH_DIR, f"{os.path.basename(batch_id)}.json")
+    if not os.path.exists(state_path):
+        raise HTTPException(status_code=404, detail=f"Unknown batch: {batch_id}")
+    
+    with open(state_path, "rb") as f:
+        cases = orjson.loads(f.read())["cases"]
+    
+    batch = await asyncio.to_thread(get_chat_batch, batch_id)
+    if batch.status != "completed":
+        return {"batch_id": batch_id, "status": batch.status, "total_submitted": len(cases)}
+    
+    batch_outputs = await asyncio.to_thread(get_chat_batch_outputs, batch)
+    results = await _finalize_batch_cases(cases, batch_outputs)
+    
+    logger.info("Completed processing %d cases from batch %s", len(results), batch_id)
+    return _batch_response(results)
@@ -0,0 +1,106 @@
+"""
+Dynamic micro-batching for the /verify-case endpoint.
+
+Concurrent requests are buffered for up to max_delay seconds (or until
+max_batch_size cases are waiting) and handed to the model as one batch.
+"""
+
+import asyncio
+import os
+from typing import Any, List, Optional, Set, Tuple
+
+from app.logic import verify_combined_case_async
+from app.schemas import CaseRequest
+
+class VerifyModel:
+    """Batch inference adapter around verify_combined_case_async"""
+
+    @staticmethod
+    def _case_key(case: CaseRequest) -> Tuple[Optional[str], ...]:
+        return (case.complaint, case.symptoms, case.diagnosis, case.lab, case.pharmacy)
+
+    async def infer(self, cases: List[CaseRequest]) -> List[Any]:
+        """
+        Verify a batch of cases. Identical cases in the batch are verified once.
+
+        Returns:
+            One CaseResponse (or Exception) per input case, in input order
+        """
+        unique_keys = list(dict.fromkeys(self._case_key(case) for case in cases))
+        outcomes = await asyncio.gather(
+            *[verify_combined_case_async(*key) for key in unique_keys],
+            return_exceptions=True
+        )
+        by_key = dict(zip(unique_keys, outcomes))
+        return [by_key[self._case_key(case)] for case in cases]
+
+class DynBatcher:
+    """Coalesce concurrent requests into batches for a model exposing async infer(items)"""
+
+    def __init__(self, model: Any, max_batch_size: int = 8, max_delay: float = 0.1):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dispatches: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start the batching loop on the running event loop"""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the batching loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def process_batched(self, item: Any) -> Any:
+        """Submit one item and wait for its result from the next batch"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Dispatch without blocking collection of the next batch
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            outcomes = await self.model.infer([item for item, _ in batch])
+        except Exception as e:
+            outcomes = [e] * len(batch)
+        for (_, future), outcome in zip(batch, outcomes):
+            if future.done():  # Client went away
+                continue
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+batcher = DynBatcher(
+    VerifyModel(),
+    max_batch_size=int(os.getenv("VERIFY_BATCH_SIZE", "8")),
+    max_delay=float(os.getenv("VERIFY_BATCH_DELAY", "0.1"))
+)
@@ -0,0 +1,75 @@
+"""
+Persistent embedding cache shared across process restarts.
+
+Embeddings are stored in a small SQLite database as float16 blobs, keyed by a
+SHA-256 digest of the embedding model and the normalized input text.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# SQLite file holding cached embeddings (empty string disables the persistent cache)
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "embed_cache.sqlite3")
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+def embedding_key(text: str, model: str) -> bytes:
+    """Cache key for the embedding of text under model (case/whitespace-insensitive)"""
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(f"{model}\x1f{normalized}".encode("utf-8")).digest()
+
+def _connection() -> Optional[sqlite3.Connection]:
+    global _conn
+    if _conn is None and EMBED_CACHE_PATH:
+        conn = sqlite3.connect(EMBED_CACHE_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+        _conn = conn
+    return _conn
+
+def get_many(keys: Iterable[bytes]) -> Dict[bytes, List[float]]:
+    """Return the cached embeddings found for keys"""
+    keys = list(keys)
+    if not keys:
+        return {}
+    try:
+        with _lock:
+            conn = _connection()
+            if conn is None:
+                return {}
+            placeholders = ",".join("?" * len(keys))
+            rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", keys).fetchall()
+    except sqlite3.Error as e:
+        print(f"Embedding cache read failed: {e}")
+        return {}
+    return {key: np.frombuffer(vector, dtype=np.float16).astype(np.float32).tolist() for key, vector in rows}
+
+def get(key: bytes) -> Optional[List[float]]:
+    """Return the cached embedding for key, or None"""
+    return get_many([key]).get(key)
+
+def put_many(items: Dict[bytes, List[float]]) -> None:
+    """Store embeddings (as float16) under their keys"""
+    if not items:
+        return
+    rows = [(key, np.asarray(vector, dtype=np.float16).tobytes()) for key, vector in items.items()]
+    try:
+        with _lock:
+            conn = _connection()
+            if conn is None:
+                return
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+    except sqlite3.Error as e:
+        print(f"Embedding cache write failed: {e}")
+
+def put(key: bytes, vector: List[float]) -> None:
+    """Store one embedding under key"""
+    put_many({key: vector})
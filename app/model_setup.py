@@ -1,19 +1,40 @@
 import os
+import hashlib
+import orjson
 import chromadb
-from openai import OpenAI
+import importlib.util
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient, RateLimitError
 from dotenv import load_dotenv
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import embed_cache
+from app.cache import LRUCache
 
 # Load environment variables
 load_dotenv()
 
 # Global clients for reuse
 _openai_client = None
+_async_openai_client = None
 _chromadb_client = None
 _use_mock = False
 _data_loaded = False
+# time.monotonic() of the last failed availability check
+_api_check_failed_at: Optional[float] = None
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# Inputs per embeddings request (keeps each request well under the token limit)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "96"))
+# Embeddings sub-batches in flight at once, and retries of a rate-limited sub-batch
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "5"))
+EMBED_MAX_RETRIES = 3
 
 class MockEmbedding:
     """Mock embedding class that returns dummy 768-dimensional vectors"""
@@ -21,23 +42,51 @@ class MockEmbedding:
     @staticmethod
     def create_dummy_embedding(text: str, dimensions: int = 1536) -> List[float]:
         """Create a deterministic dummy embedding based on text hash"""
-        # Use text hash to create deterministic but varied embeddings
-        text_hash = hash(text) % (2**31)
-        random.seed(text_hash)
-        
-        # Generate normalized random vector
-        embedding = [random.gauss(0, 1) for _ in range(dimensions)]
+        # Seed from a stable digest (str hash() is randomized per process) so the
+        # same text gets the same vector in every worker and across restarts
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        rng = np.random.default_rng(seed)
         
-        # Normalize the vector
-        magnitude = sum(x**2 for x in embedding) ** 0.5
+        # Generate normalized random vector in one NumPy call
+        embedding = rng.standard_normal(dimensions, dtype=np.float32)
+        magnitude = np.linalg.norm(embedding)
         if magnitude > 0:
-            embedding = [x / magnitude for x in embedding]
+            embedding /= magnitude
         
-        return embedding
+        return embedding.tolist()
 
 class MockLLM:
     """Mock LLM class that returns static responses for testing"""
     
+    # Clinical suggestions, in priority order when several terms match
+    _SUGGESTIONS = {
+        "fatigue": "1. Document specific fatigue symptoms and duration\n2. Request sleep study if chronic\n3. Consider alternative symptom descriptions",
+        "vitamin d": "1. Request physician documentation of deficiency\n2. Consider calcium-rich foods instead\n3. Sunlight exposure recommendations",
+        "eye examination": "1. Document medical necessity beyond vision correction\n2. Request ophthalmologist referral for medical condition\n3. Consider covered diagnostic tests",
+    }
+    _DEFAULT_SUGGESTION = "1. Document medical necessity\n2. Consider covered alternatives\n3. Consult with physician"
+    
+    # Policy evaluations of excluded items, in priority order when several terms match
+    _EXCLUDED_TERMS = {
+        "fatigue": "Excluded. The symptom of fatigue is explicitly stated in the policy clause.",
+        "eye examination": "Excluded. The clause explicitly mentions sight correction tests which include 'Eye examination'.",
+        "vitamin d": "Excluded. Vitamin D is part of routine checkup exclusions.",
+        "cosmetic": "Excluded. This item is not covered under the policy.",
+    }
+    _EXCLUDED_RE = re.compile("|".join(re.escape(term) for term in _EXCLUDED_TERMS))
+    _ALLOWED_RESPONSE = "Allowed. This item is not excluded in the clause."
+    
+    @classmethod
+    def _first_match(cls, value_lower: str, responses: Dict[str, str]) -> Optional[str]:
+        """Response of the highest-priority term found in value_lower"""
+        found = set(cls._EXCLUDED_RE.findall(value_lower))
+        if not found:
+            return None
+        for term, response in responses.items():
+            if term in found:
+                return response
+        return None
+    
     @staticmethod
     def get_mock_response(prompt: str, field_name: str = "", value: str = "") -> str:
         """Return mock responses based on prompt content"""
@@ -46,35 +95,10 @@ class MockLLM:
         
         # Handle clinical suggestions requests
         if "suggest" in prompt_lower and "alternatives" in prompt_lower:
-            if "fatigue" in value_lower:
-                return "1. Document specific fatigue symptoms and duration\n2. Request sleep study if chronic\n3. Consider alternative symptom descriptions"
-            elif "vitamin d" in value_lower:
-                return "1. Request physician documentation of deficiency\n2. Consider calcium-rich foods instead\n3. Sunlight exposure recommendations"
-            elif "eye examination" in value_lower:
-                return "1. Document medical necessity beyond vision correction\n2. Request ophthalmologist referral for medical condition\n3. Consider covered diagnostic tests"
-            else:
-                return "1. Document medical necessity\n2. Consider covered alternatives\n3. Consult with physician"
-        
-        # Mock responses for policy evaluation
-        if any(term in value_lower for term in ["fatigue", "eye examination", "vitamin d", "cosmetic"]):
-            if "fatigue" in value_lower:
-                return "Excluded. The symptom of fatigue is explicitly stated in the policy clause."
-            elif "eye examination" in value_lower:
-                return "Excluded. The clause explicitly mentions sight correction tests which include 'Eye examination'."
-            elif "vitamin d" in value_lower:
-                return "Excluded. Vitamin D is part of routine checkup exclusions."
-            else:
-                return "Excluded. This item is not covered under the policy."
-        
-        # Mock responses for allowed items
-        if any(term in value_lower for term in ["chest pain", "headache", "fever", "antibiotics", "appendicitis", "migraine"]):
-            return "Allowed. This item is not excluded in the clause."
+            return MockLLM._first_match(value_lower, MockLLM._SUGGESTIONS) or MockLLM._DEFAULT_SUGGESTION
         
-        # Default response based on prompt type
-        if "excluded" in prompt_lower or "exclusion" in prompt_lower:
-            return "Allowed. This item is not excluded in the clause."
-        
-        return "Allowed. This item is not excluded in the clause."
+        # Mock responses for policy evaluation; everything else is allowed
+        return MockLLM._first_match(value_lower, MockLLM._EXCLUDED_TERMS) or MockLLM._ALLOWED_RESPONSE
 
 def force_mock_mode():
     """Force the system to use mock mode for testing"""
@@ -88,14 +112,20 @@ def is_mock_mode() -> bool:
 
 def reset_system():
     """Reset all cached clients and mock mode flags to force re-initialization"""
-    global _openai_client, _chromadb_client, _use_mock
+    global _openai_client, _async_openai_client, _chromadb_client, _use_mock, _data_loaded, _api_check_failed_at
     _openai_client = None
+    _async_openai_client = None
     _chromadb_client = None
     _use_mock = False
+    _api_check_failed_at = None
+    # Collections belong to the old ChromaDB client; rebuild them on next use
+    with _init_lock:
+        collections.clear()
+        _data_loaded = False
     print("🔄 System reset - will re-check API availability")
 
-def check_api_availability() -> bool:
-    """Check if OpenAI API is available and has quota"""
+def check_api_availability(client: Optional[OpenAI] = None) -> bool:
+    """Check if OpenAI API is available and has quota, optionally through an existing client"""
     try:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
@@ -103,8 +133,9 @@ def check_api_availability() -> bool:
             return False
         
         # Try a simple API call to check quota with timeout
-        client = OpenAI(api_key=api_key, timeout=10.0)  # 10 second timeout
-        response = client.embeddings.create(
+        if client is None:
+            client = OpenAI(api_key=api_key)
+        response = client.with_options(timeout=10.0).embeddings.create(  # 10 second timeout
             input="test",
             model="text-embedding-ada-002"
         )
@@ -118,17 +149,58 @@ def check_api_availability() -> bool:
         print(f"OpenAI API error, switching to mock mode: {e}")
         return False
 
+# Connection pool shared by all requests made through a client
+OPENAI_POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "50"))
+)
+
+# HTTP/2 multiplexes concurrent calls over one connection, but needs the h2 package
+OPENAI_HTTP2 = importlib.util.find_spec("h2") is not None
+
+# Default per-request timeout (seconds) of the shared clients
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+
+# Seconds a failed availability check is trusted before the API is probed again
+API_RECHECK_INTERVAL = float(os.getenv("API_RECHECK_INTERVAL", "300"))
+
 def get_openai_client() -> OpenAI:
     """Get or create an OpenAI client"""
-    global _openai_client, _use_mock
+    global _openai_client, _use_mock, _api_check_failed_at
     if _openai_client is None:
-        if not check_api_availability():
+        if _api_check_failed_at is not None and time.monotonic() - _api_check_failed_at < API_RECHECK_INTERVAL:
+            return None
+        api_key = os.getenv("OPENAI_API_KEY")
+        client = OpenAI(
+            api_key=api_key,
+            timeout=OPENAI_TIMEOUT,
+            http_client=DefaultHttpxClient(limits=OPENAI_POOL_LIMITS, http2=OPENAI_HTTP2)
+        ) if api_key else None
+        # Check through the pooled client so its warm connection is reused afterwards
+        if not check_api_availability(client):
+            if client is not None:
+                client.close()
+            _api_check_failed_at = time.monotonic()
             _use_mock = True
             print("⚠️  Using mock mode - OpenAI API not available")
             return None
-        _openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        _openai_client = client
     return _openai_client
 
+def get_async_openai_client() -> AsyncOpenAI:
+    """Get or create an AsyncOpenAI client for use inside async endpoints"""
+    global _async_openai_client
+    if _async_openai_client is None:
+        # Share the availability check (and mock mode) with the sync client
+        if get_openai_client() is None:
+            return None
+        _async_openai_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=OPENAI_TIMEOUT,
+            http_client=DefaultAsyncHttpxClient(limits=OPENAI_POOL_LIMITS, http2=OPENAI_HTTP2)
+        )
+    return _async_openai_client
+
 def get_chromadb_client() -> chromadb.Client:
     """Initialize and return a ChromaDB client"""
     global _chromadb_client
@@ -176,11 +248,18 @@ def embed_text(text: str) -> List[float]:
             _use_mock = True
             return MockEmbedding.create_dummy_embedding(text)
             
+        key = embed_cache.embedding_key(text, EMBEDDING_MODEL)
+        cached = embed_cache.get(key)
+        if cached is not None:
+            return cached
+        
         response = client.embeddings.create(
             input=text,
-            model="text-embedding-ada-002"
+            model=EMBEDDING_MODEL
         )
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        embed_cache.put(key, embedding)
+        return embedding
     except Exception as e:
         error_str = str(e).lower()
         if "quota" in error_str or "insufficient" in error_str or "429" in error_str:
@@ -192,6 +271,86 @@ def embed_text(text: str) -> List[float]:
         # Return mock embedding as fallback
         return MockEmbedding.create_dummy_embedding(text)
 
+def _embed_batch(client: OpenAI, texts: List[str], jitter: bool = False) -> List[List[float]]:
+    """Embed one sub-batch, retrying rate-limited requests after their Retry-After delay"""
+    if jitter:
+        # Spread concurrent sub-batches so they don't hit the rate limiter together
+        time.sleep(random.uniform(0, 0.05))
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            response = client.embeddings.create(input=texts, model=EMBEDDING_MODEL)
+            break
+        except RateLimitError as e:
+            # Quota exhaustion won't clear up; let the caller switch to mock embeddings
+            if attempt == EMBED_MAX_RETRIES or "quota" in str(e).lower():
+                raise
+            try:
+                delay = float(e.response.headers.get("retry-after", ""))
+            except ValueError:
+                delay = 2 ** attempt
+            time.sleep(delay + random.uniform(0, 0.05))
+    # The API returns one item per input, tagged with its position in the batch
+    vectors: List[List[float]] = [None] * len(texts)
+    for item in response.data:
+        vectors[item.index] = item.embedding
+    return vectors
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Generate embeddings for several texts, EMBED_BATCH_SIZE inputs per OpenAI request (or mock)"""
+    global _use_mock
+    
+    if not texts:
+        return []
+    
+    # Use mock if API is not available
+    if _use_mock:
+        return [MockEmbedding.create_dummy_embedding(text) for text in texts]
+    
+    try:
+        client = get_openai_client()
+        if client is None:  # API check failed
+            _use_mock = True
+            return [MockEmbedding.create_dummy_embedding(text) for text in texts]
+        
+        # Only texts missing from the persistent cache are sent to the API
+        keys = [embed_cache.embedding_key(text, EMBEDDING_MODEL) for text in texts]
+        cached = embed_cache.get_many(keys)
+        pending = {key: text for key, text in zip(keys, texts) if key not in cached}
+        missing = list(pending)
+        batches = [missing[start:start + EMBED_BATCH_SIZE] for start in range(0, len(missing), EMBED_BATCH_SIZE)]
+        if len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=min(EMBED_CONCURRENCY, len(batches))) as pool:
+                batch_vectors = list(pool.map(
+                    lambda batch: _embed_batch(client, [pending[key] for key in batch], jitter=True), batches
+                ))
+        else:
+            batch_vectors = [_embed_batch(client, [pending[key] for key in batch]) for batch in batches]
+        for batch, vectors in zip(batches, batch_vectors):
+            fresh = dict(zip(batch, vectors))
+            embed_cache.put_many(fresh)
+            cached.update(fresh)
+        return [cached[key] for key in keys]
+    except Exception as e:
+        error_str = str(e).lower()
+        if "quota" in error_str or "insufficient" in error_str or "429" in error_str:
+            print(f"⚠️  OpenAI quota exceeded, switching to mock embeddings: {e}")
+            _use_mock = True
+            return [MockEmbedding.create_dummy_embedding(text) for text in texts]
+        
+        print(f"Error generating embeddings: {e}")
+        # Return mock embeddings as fallback
+        return [MockEmbedding.create_dummy_embedding(text) for text in texts]
+
+# Completions of temperature-0 prompts, keyed by a digest of model, system and user prompt
+_query_llm_cache = LRUCache(maxsize=int(os.getenv("QUERY_LLM_CACHE_SIZE", "4096")))
+
+def _query_llm_key(model: str, system_prompt: Optional[str], prompt: str) -> bytes:
+    return hashlib.sha256("\x1f".join((model, system_prompt or "", prompt)).encode("utf-8")).digest()
+
+def clear_llm_cache() -> None:
+    """Drop cached query_llm completions"""
+    _query_llm_cache.clear()
+
 def query_llm(prompt: str, model: str = "gpt-4o-mini", system_prompt: Optional[str] = None, temperature: float = 0.0, field_name: str = "", value: str = "") -> str:
     """Query the OpenAI LLM with a prompt or return mock response"""
     global _use_mock
@@ -200,16 +359,23 @@ def query_llm(prompt: str, model: str = "gpt-4o-mini", system_prompt: Optional[s
     if _use_mock:
         return MockLLM.get_mock_response(prompt, field_name, value)
     
+    # Temperature 0 is deterministic enough to reuse an earlier answer
+    cache_key = _query_llm_key(model, system_prompt, prompt) if temperature == 0.0 else None
+    if cache_key is not None:
+        cached = _query_llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
     try:
         client = get_openai_client()
         if client is None:  # API check failed
             _use_mock = True
             return MockLLM.get_mock_response(prompt, field_name, value)
             
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
+        messages = (
+            [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]
+            if system_prompt else [{"role": "user", "content": prompt}]
+        )
         
         response = client.chat.completions.create(
             model=model,
@@ -217,7 +383,10 @@ def query_llm(prompt: str, model: str = "gpt-4o-mini", system_prompt: Optional[s
             temperature=temperature,
             timeout=30.0  # 30 second timeout for LLM calls
         )
-        return response.choices[0].message.content
+        content = response.choices[0].message.content
+        if cache_key is not None and content is not None:
+            _query_llm_cache.set(cache_key, content)
+        return content
     except Exception as e:
         error_str = str(e).lower()
         if "quota" in error_str or "insufficient" in error_str or "429" in error_str:
@@ -228,6 +397,93 @@ def query_llm(prompt: str, model: str = "gpt-4o-mini", system_prompt: Optional[s
         print(f"Error querying LLM: {e}")
         return MockLLM.get_mock_response(prompt, field_name, value)
 
+def submit_chat_batch(requests: Dict[str, Dict[str, Any]]) -> Any:
+    """
+    Submit chat completion requests to the OpenAI Batch API.
+    
+    Args:
+        requests: Maps a unique custom_id to a chat completion request body
+        
+    Returns:
+        The created OpenAI batch object
+    """
+    client = get_openai_client()
+    if client is None:
+        raise RuntimeError("OpenAI API not available, cannot submit batch")
+    
+    lines = [
+        orjson.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": body
+        })
+        for custom_id, body in requests.items()
+    ]
+    batch_file = client.files.create(
+        file=("batch_requests.jsonl", b"\n".join(lines)),
+        purpose="batch"
+    )
+    return client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+
+def get_chat_batch(batch_id: str) -> Any:
+    """Retrieve an OpenAI batch object by id"""
+    client = get_openai_client()
+    if client is None:
+        raise RuntimeError("OpenAI API not available, cannot retrieve batch")
+    return client.batches.retrieve(batch_id)
+
+def get_chat_batch_outputs(batch: Any) -> Dict[str, Any]:
+    """
+    Download the results of a completed OpenAI batch.
+    
+    Returns:
+        Maps each custom_id to the response text, or to an Exception for
+        requests that failed
+    """
+    client = get_openai_client()
+    outputs = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                error = record.get("error") or response.get("body", {}).get("error")
+                outputs[record["custom_id"]] = Exception(f"Batch request failed: {error}")
+                continue
+            outputs[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return outputs
+
+# Pre-computed policy embeddings written by bake_exclusions.py, one .npz per collection
+BAKED_EMBEDDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+def policy_digest(documents: List[str]) -> str:
+    """Digest of a collection's documents and the embedding model, stamped into baked files"""
+    return hashlib.sha256("\x1e".join([EMBEDDING_MODEL, *documents]).encode("utf-8")).hexdigest()
+
+def _baked_embeddings(collection_name: str, documents: List[str]) -> Optional[np.ndarray]:
+    """Baked embedding matrix for documents, or None if missing or baked from other text"""
+    path = os.path.join(BAKED_EMBEDDINGS_DIR, f"{collection_name}.npz")
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as baked:
+            if str(baked["digest"]) != policy_digest(documents):
+                print(f"Baked embeddings for {collection_name} are stale, re-embedding")
+                return None
+            return baked["embeddings"].astype(np.float32)
+    except Exception as e:
+        print(f"Error reading baked embeddings for {collection_name}: {e}")
+        return None
+
 # Vector Database Population
 def load_policy_data(collections: Dict[str, Any], policy_data: Dict[str, List[str]]) -> None:
     """Load policy data into ChromaDB collections"""
@@ -249,7 +505,10 @@ def load_policy_data(collections: Dict[str, Any], policy_data: Dict[str, List[st
         
         # Add new data only if collection is empty
         ids = [f"policy_{i}" for i in range(len(data_list))]
-        embeddings = [embed_text(text) for text in data_list]
+        # One contiguous float32 matrix; Chroma takes it without re-casting each row
+        embeddings = _baked_embeddings(collection_name, data_list)
+        if embeddings is None:
+            embeddings = np.asarray(embed_texts(data_list), dtype=np.float32)
         metadatas = [{"source": "policy_document", "index": i} for i in range(len(data_list))]
         
         try:
@@ -265,8 +524,9 @@ def load_policy_data(collections: Dict[str, Any], policy_data: Dict[str, List[st
         
     print(f"Policy data loading completed for {len(policy_data)} collections")
 
-# Initialize collections on module import
-collections = setup_collections()
+# ChromaDB collections, filled in by ensure_initialized()
+collections: Dict[str, Any] = {}
+_init_lock = threading.Lock()
 
 # Policy data from notebook - CBRE Services and Asry policies
 main_policy_text = """
@@ -330,58 +590,68 @@ Examples (Applied Rules)
 
 #sub_policy_text = ""
 
+# Lines that only separate policy sections
+_SEPARATOR_LINES = frozenset({"---", "—", "–––"})
+
+# Phrasing that marks a line as a policy rule/exclusion
+_EXCLUSION_KEYWORDS = (
+    "not covered",
+    "excluded",
+    "will be denied",
+    "denied unless",
+    "maximum prescription coverage",
+    "max 10 days",
+    "require prior approval",
+    "requires prior approval",
+    "only approved strengths",
+    "non-formulary",
+    "generic equivalents",
+    "brand substitution",
+    "must be",
+    "mandatory for evaluation",
+)
+_EXCLUSION_RE = re.compile("|".join(re.escape(kw) for kw in _EXCLUSION_KEYWORDS))
+
 # Extract exclusion lines from policies (Policy Parsing & Chunking)
-def extract_exclusion_lines(policy_text: str) -> List[str]:
-    """Extract meaningful policy rules/exclusions from text."""
-    extracted: List[str] = []
+def extract_exclusion_lines(policy_text: str) -> Iterator[str]:
+    """Yield meaningful policy rules/exclusions from text."""
     for raw_line in policy_text.splitlines():
         line = raw_line.strip()
         if not line:
             continue
         # Skip separators
-        if line in {"---", "—", "–––"}:
+        if line in _SEPARATOR_LINES:
             continue
         # Keep original dash bullet behavior
         if line.startswith("-"):
-            extracted.append(line.lstrip("- ").strip())
-            continue
-        # Capture common policy rule/exclusion phrasing
-        lower = line.lower()
-        if any(kw in lower for kw in [
-            "not covered",
-            "excluded",
-            "will be denied",
-            "denied unless",
-            "maximum prescription coverage",
-            "max 10 days",
-            "require prior approval",
-            "requires prior approval",
-            "only approved strengths",
-            "non-formulary",
-            "generic equivalents",
-            "brand substitution",
-            "must be",
-            "mandatory for evaluation"
-        ]):
-            extracted.append(line)
-            continue
-        # Keep example lines with arrows, they are explicit rules
-        if "→" in line:
-            extracted.append(line)
-    return extracted
+            yield line.lstrip("- ").strip()
+        # Capture common policy rule/exclusion phrasing, and example lines with
+        # arrows, which are explicit rules
+        elif _EXCLUSION_RE.search(line.lower()) or "→" in line:
+            yield line
 
-# Load policy data into collections only once
-if not _data_loaded:
-    try:
-        main_exclusions = extract_exclusion_lines(main_policy_text)
-        
-        policy_data = {
-            "main_exclusions": main_exclusions
-        }
-        
-        load_policy_data(collections, policy_data)
-        print(f"Successfully loaded {len(main_exclusions)} main exclusions")
-        _data_loaded = True
-        
-    except Exception as e:
-        print(f"Error loading policy data: {e}")
+def get_policy_data() -> Dict[str, List[str]]:
+    """Documents of each policy collection, extracted from the policy texts"""
+    return {
+        "main_exclusions": list(extract_exclusion_lines(main_policy_text))
+    }
+
+def ensure_initialized() -> Dict[str, Any]:
+    """Set up the collections and load the policy data into them, once per process"""
+    global _data_loaded
+    if _data_loaded:
+        return collections
+    with _init_lock:
+        if _data_loaded:
+            return collections
+        collections.update(setup_collections())
+        try:
+            policy_data = get_policy_data()
+            
+            load_policy_data(collections, policy_data)
+            print(f"Successfully loaded {len(policy_data['main_exclusions'])} main exclusions")
+            _data_loaded = True
+            
+        except Exception as e:
+            print(f"Error loading policy data: {e}")
+    return collections
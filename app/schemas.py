@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Union, Dict, Any
 
 class ClinicalFlag(BaseModel):
@@ -23,6 +23,24 @@ class CaseRequest(BaseModel):
     lab: Optional[str] = None
     pharmacy: Optional[str] = None
 
+class FieldRegenRequest(BaseModel):
+    field_name: str = Field(min_length=1)
+    value: str = Field(min_length=1)
+    explanation: str = Field(min_length=1)
+    policy_source: str = "Policy"
+    diagnosis: str = ""
+    complaint: str = ""
+    symptoms: str = ""
+
+class ClinicalRegenRequest(BaseModel):
+    flagged_field: str = Field(min_length=1)
+    flagged_item: str = Field(min_length=1)
+    diagnosis: str = ""
+    complaint: str = ""
+    symptoms: str = ""
+    lab: str = ""
+    pharmacy: str = ""
+
 class CaseResponse(BaseModel):
     case_id: str = "single_case"
     final_decision: str  # "Allowed" or "Excluded"
@@ -39,3 +57,8 @@ class CaseResult(BaseModel):
 class BatchResponse(BaseModel):
     results: List[CaseResult]
     total_processed: int
+
+class BatchJobResponse(BaseModel):
+    batch_id: str
+    status: str
+    total_submitted: int
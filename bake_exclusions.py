@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Bake the policy collection embeddings into app/data/<collection>.npz
+
+Run once after changing the policy text (needs OPENAI_API_KEY). Fresh
+deployments then load the collections from these files without calling
+the embeddings API.
+"""
+
+import os
+
+import numpy as np
+
+from app.model_setup import (
+    BAKED_EMBEDDINGS_DIR, EMBED_BATCH_SIZE, EMBEDDING_MODEL, get_openai_client, get_policy_data, policy_digest
+)
+
+def main():
+    client = get_openai_client()
+    if client is None:
+        raise SystemExit("OpenAI API not available; refusing to bake mock embeddings")
+    
+    os.makedirs(BAKED_EMBEDDINGS_DIR, exist_ok=True)
+    for collection_name, documents in get_policy_data().items():
+        # Call the API directly so a failed request aborts instead of baking mock vectors
+        vectors = []
+        for start in range(0, len(documents), EMBED_BATCH_SIZE):
+            response = client.embeddings.create(input=documents[start:start + EMBED_BATCH_SIZE], model=EMBEDDING_MODEL)
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        embeddings = np.asarray(vectors, dtype=np.float32)
+        path = os.path.join(BAKED_EMBEDDINGS_DIR, f"{collection_name}.npz")
+        np.savez_compressed(
+            path,
+            documents=np.array(documents),
+            embeddings=embeddings,
+            model=np.array(EMBEDDING_MODEL),
+            digest=np.array(policy_digest(documents))
+        )
+        print(f"✅ Baked {len(documents)} embeddings for {collection_name} into {path}")
+
+if __name__ == "__main__":
+    main()
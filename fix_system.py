@@ -4,11 +4,97 @@ InsurAgent System Fix Script
 This script fixes the "undefined" response issues by updating the verification logic.
 """
 
+import ast
 import os
 import sys
 import shutil
+import tempfile
 from pathlib import Path
 
+def replace_python_function(source: str, name: str, replacement: str) -> str:
+    """Replace the top-level function `name` in Python source, located with ast"""
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == name:
+            lines = source.splitlines(keepends=True)
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1
+            return "".join(lines[:start]) + replacement.rstrip("\n") + "\n" + "".join(lines[node.end_lineno:])
+    return source
+
+def _js_block_end(source: str, start: int) -> int:
+    """Index just past the {...} block opening at source[start], skipping strings and comments"""
+    depth = 0
+    # Open template literals, by the brace depth their ${...} substitutions started at
+    templates = []
+    i = start
+    while i < len(source):
+        ch = source[i]
+        if templates and depth == templates[-1]:
+            # Inside template literal text
+            if ch == "\\":
+                i += 2
+                continue
+            if ch == "`":
+                templates.pop()
+            elif source.startswith("${", i):
+                depth += 1
+                i += 2
+                continue
+        elif ch in "'\"":
+            i += 1
+            while i < len(source) and source[i] != ch:
+                i += 2 if source[i] == "\\" else 1
+        elif ch == "`":
+            templates.append(depth)
+        elif source.startswith("//", i):
+            i = source.find("\n", i)
+            if i < 0:
+                return len(source)
+        elif source.startswith("/*", i):
+            i = source.find("*/", i) + 1
+            if i <= 0:
+                return len(source)
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return len(source)
+
+def replace_js_function(source: str, name: str, replacement: str) -> str:
+    """Replace the JavaScript function declaration `name` in source"""
+    start = source.find(f"function {name}(")
+    if start < 0:
+        return source
+    body = source.find("{", source.find(")", start))
+    return source[:start] + replacement + source[_js_block_end(source, body):]
+
+def write_if_changed(path: str, content: str) -> bool:
+    """
+    Atomically replace path with content, skipping the write when the file
+    already holds it. Returns True if the file was written.
+    """
+    data = content.encode("utf-8")
+    exists = os.path.exists(path)
+    if exists:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    # Write next to the target and rename over it, so readers never see a partial file
+    with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(path) or ".", delete=False) as tmp:
+        tmp.write(data)
+    if exists:
+        shutil.copymode(path, tmp.name)  # Temp files are created 0600
+    os.replace(tmp.name, path)
+    return True
+
+def _report_write(path: str, content: str) -> None:
+    if write_if_changed(path, content):
+        print(f"✅ Fixed {path}")
+    else:
+        print(f"✅ {path} already up to date")
+
 def fix_system():
     """Fix the InsurAgent system by updating the problematic components"""
     
@@ -26,7 +112,8 @@ def fix_system():
     for file_path in files_to_backup:
         if os.path.exists(file_path):
             backup_path = f"{file_path}.backup"
-            shutil.copy2(file_path, backup_path)
+            # Contents only: copyfile uses os.sendfile on Linux and skips copy2's stat/chmod/utime calls
+            shutil.copyfile(file_path, backup_path)
             print(f"✅ Backed up {file_path} to {backup_path}")
     
     # Step 2: Fix schemas.py
@@ -74,9 +161,7 @@ class BatchResponse(BaseModel):
     total_processed: int
 '''
     
-    with open("app/schemas.py", "w") as f:
-        f.write(schemas_content)
-    print("✅ Fixed app/schemas.py")
+    _report_write("app/schemas.py", schemas_content)
     
     # Step 3: Add the corrected function to logic.py
     print("\n3️⃣ Fixing logic.py...")
@@ -86,11 +171,6 @@ class BatchResponse(BaseModel):
         current_content = f.read()
     
     # Find and replace the verify_combined_case function
-    import re
-    
-    # Pattern to match the function definition and its body
-    pattern = r'def verify_combined_case\([^)]*\) -> CaseResponse:.*?(?=\n\ndef|\n\nclass|\Z)'
-    
     corrected_function = '''def verify_combined_case(
     complaint: Optional[str] = None,
     symptoms: Optional[str] = None,
@@ -102,14 +182,15 @@ class BatchResponse(BaseModel):
     Verify a combined case with multiple fields against policy exclusions.
     FIXED VERSION - Properly handles data structures and returns correct format.
     """
+    from concurrent.futures import ThreadPoolExecutor
+    
     print(f"🔍 Processing case: complaint='{complaint}', symptoms='{symptoms}', diagnosis='{diagnosis}', lab='{lab}', pharmacy='{pharmacy}'")
     
-    # Initialize clients with error handling
+    # Initialize clients with error handling; both the clients and the collection
+    # handles are created once per process and reused from here on
     try:
-        chroma_client = get_chromadb_client()
         llm_client = get_openai_client()
-        main_exclusion_db = chroma_client.get_collection("main_exclusions")
-        sub_policies_db = chroma_client.get_collection("sub_policies")
+        main_exclusion_db = ensure_initialized()["main_exclusions"]
     except Exception as e:
         print(f"❌ Error initializing clients: {e}")
         # Return a basic response if initialization fails
@@ -143,6 +224,16 @@ class BatchResponse(BaseModel):
     
     results = []
     final_flag = "Allowed"
+    # Field results still waiting on policy search + LLM
+    pending = []
+    
+    # Explanations shown for the shared special-case rules, by the rule's reason
+    rule_explanations = {
+        "Hepatitis A is explicitly covered": "Allowed. Hepatitis A is explicitly covered in the policy.",
+        "Vitamin D is part of routine checkup exclusions": "Excluded. Vitamin D is part of routine checkup exclusions per policy.",
+        "All hepatitis types except Hepatitis A are excluded": "Excluded. All hepatitis types except Hepatitis A are excluded per policy.",
+        "Skipped non-D vitamin": "Allowed. Only Vitamin D is excluded, other vitamins are covered.",
+    }
     
     # Process each field
     for field in required:
@@ -161,106 +252,80 @@ class BatchResponse(BaseModel):
         
         query_norm = query.lower().strip()
         
-        # Special case handling (Insurance Agent Logic)
-        if query_norm.startswith("vitamin") and query_norm != "vitamin d":
+        # Special case handling (Insurance Agent Logic): one exact-term lookup, then
+        # the "vitamin*" / "hepatitis*" prefix rules shared with the main pipeline
+        rule = _rule_decide(query_norm)
+        if rule is not None:
+            decision, reason = rule
             results.append({
                 "field": field,
                 "value": query,
-                "decision": "Allowed",
-                "explanation": "Allowed. Only Vitamin D is excluded, other vitamins are covered.",
+                "decision": decision,
+                "explanation": rule_explanations.get(reason, f"{decision}. {reason}."),
                 "policy_source": "Main Policy",
-                "probability": 100
+                "probability": 0 if decision == "Excluded" else 100
             })
+            if decision == "Excluded":
+                final_flag = "Excluded"
             continue
         
-        if query_norm == "hepatitis a":
-            results.append({
-                "field": field,
-                "value": query,
-                "decision": "Allowed",
-                "explanation": "Allowed. Hepatitis A is explicitly covered in the policy.",
-                "policy_source": "Main Policy",
-                "probability": 100
-            })
-            continue
-            
-        if query_norm.startswith("hepatitis") and query_norm != "hepatitis a":
-            results.append({
-                "field": field,
-                "value": query,
-                "decision": "Excluded",
-                "explanation": "Excluded. All hepatitis types except Hepatitis A are excluded per policy.",
-                "policy_source": "Main Policy",
-                "probability": 0
-            })
-            final_flag = "Excluded"
-            continue
-        
-        if query_norm == "vitamin d":
-            results.append({
-                "field": field,
-                "value": query,
-                "decision": "Excluded",
-                "explanation": "Excluded. Vitamin D is part of routine checkup exclusions per policy.",
-                "policy_source": "Main Policy",
-                "probability": 0
-            })
-            final_flag = "Excluded"
-            continue
-        
-        # Default case - use policy search and LLM
+        # Default case - use policy search and LLM, for all such fields at once below
+        result = {
+            "field": field,
+            "value": query,
+            "decision": "Allowed",
+            "explanation": "No exclusion matched in policy documents.",
+            "policy_source": "None",
+            "probability": 100
+        }
+        results.append(result)
+        pending.append(result)
+    
+    # One embeddings request and one Chroma query for every field left to the LLM
+    matches = []
+    if pending:
         try:
-            query_embedding = embed_text(query)
-            main_results = main_exclusion_db.query(query_embeddings=[query_embedding], n_results=3)
-            
-            if main_results["documents"][0]:
-                context = main_results["documents"][0][0]
-                prompt = prompts_dict[field]
-                prompt_formatted = prompt.format_messages(context=context, question=query)
-                
-                response = llm_client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[{"role": "user", "content": prompt_formatted[0].content}],
-                    temperature=0.0
-                )
-                
-                result_text = response.choices[0].message.content.strip()
-                result = result_text.split()[0].strip(".").capitalize()
+            query_embeddings = embed_texts([result["value"] for result in pending])
+            main_results = main_exclusion_db.query(query_embeddings=query_embeddings, n_results=3)
+            matches = [(result, documents[0]) for result, documents in zip(pending, main_results["documents"]) if documents]
+        except Exception as e:
+            print(f"❌ Error searching policy documents: {e}")
+            for result in pending:
+                result["explanation"] = f"Error during evaluation: {str(e)}. Defaulting to Allowed."
+                result["policy_source"] = "Error"
+    
+    def _classify(result, context):
+        prompt_formatted = prompts_dict[result["field"]].format(context=context, question=result["value"])
+        response = llm_client.chat.completions.create(
+            model="gpt-4",
+            messages=[{"role": "user", "content": prompt_formatted}],
+            temperature=0.0
+        )
+        # Parsed here so an empty or None reply takes the per-field error path below
+        result_text = (response.choices[0].message.content or "").strip()
+        if not result_text:
+            raise ValueError("Empty LLM response")
+        return result_text, result_text.split()[0].strip(".").capitalize()
+    
+    # The chat completions of all fields run concurrently
+    if matches:
+        with ThreadPoolExecutor(max_workers=len(matches)) as pool:
+            futures = [(result, pool.submit(_classify, result, context)) for result, context in matches]
+            for result, future in futures:
+                try:
+                    result_text, decision = future.result()
+                except Exception as e:
+                    print(f"❌ Error processing {result['field']}: {e}")
+                    result["explanation"] = f"Error during evaluation: {str(e)}. Defaulting to Allowed."
+                    result["policy_source"] = "Error"
+                    continue
                 
-                if result.lower() == "excluded":
+                if decision.lower() == "excluded":
                     final_flag = "Excluded"
-                    probability = 0
-                else:
-                    probability = 100
-                
-                results.append({
-                    "field": field,
-                    "value": query,
-                    "decision": result,
-                    "explanation": result_text,
-                    "policy_source": "Main Policy",
-                    "probability": probability
-                })
-            else:
-                results.append({
-                    "field": field,
-                    "value": query,
-                    "decision": "Allowed",
-                    "explanation": "No exclusion matched in policy documents.",
-                    "policy_source": "None",
-                    "probability": 100
-                })
-                
-        except Exception as e:
-            print(f"❌ Error processing {field}: {e}")
-            results.append({
-                "field": field,
-                "value": query,
-                "decision": "Allowed",
-                "explanation": f"Error during evaluation: {str(e)}. Defaulting to Allowed.",
-                "policy_source": "Error",
-                "probability": 100
-            })
+                    result["probability"] = 0
+                result["decision"] = decision
+                result["explanation"] = result_text
+                result["policy_source"] = "Main Policy"
     
     # Calculate approval probability
     approval_score = 100
@@ -269,34 +334,36 @@ class BatchResponse(BaseModel):
     
     approval_probability = max(0, approval_score)
     
-    # Create field breakdown with proper structure
+    # Create field breakdown with proper structure (our own data, so no re-validation),
+    # collecting the policy sources in the same pass (dict keys dedupe in order)
     field_breakdown = {}
+    policy_sources = {}
     for result in results:
-        field_breakdown[result["field"]] = FieldBreakdown(
+        if result["policy_source"] not in {"None", "Error"}:
+            policy_sources[result["policy_source"]] = None
+        field_breakdown[result["field"]] = FieldBreakdown.model_construct(
             field=result["field"],
             value=result["value"],
             result=result["decision"],
             decision=result["decision"],
             explanation=result["explanation"],
             policy_source=result["policy_source"],
-            probability=result["probability"]
+            probability=float(result["probability"])
         )
     
-    return CaseResponse(
+    return CaseResponse.model_construct(
         case_id="single_case",
         final_decision=final_flag,
-        approval_probability=approval_probability,
+        approval_probability=float(approval_probability),
         field_breakdown=field_breakdown,
         clinical_flags=[],
-        policy_sources=list(set([r["policy_source"] for r in results if r["policy_source"] not in ["None", "Error"]]))
+        policy_sources=list(policy_sources)
     )'''
     
     # Replace the function
-    new_content = re.sub(pattern, corrected_function, current_content, flags=re.DOTALL)
+    new_content = replace_python_function(current_content, "verify_combined_case", corrected_function)
     
-    with open("app/logic.py", "w") as f:
-        f.write(new_content)
-    print("✅ Fixed app/logic.py")
+    _report_write("app/logic.py", new_content)
     
     # Step 4: Fix frontend JavaScript
     print("\n4️⃣ Fixing frontend JavaScript...")
@@ -358,12 +425,9 @@ function generateClinicalTableRows(patient, result) {
         js_content = f.read()
     
     # Find and replace the generateClinicalTableRows function
-    js_pattern = r'function generateClinicalTableRows\([^)]*\) \{[^}]*\}(?:\s*\})*'
-    js_content = re.sub(js_pattern, js_fix.strip(), js_content, flags=re.DOTALL)
+    js_content = replace_js_function(js_content, "generateClinicalTableRows", js_fix.strip())
     
-    with open("frontend/app.js", "w") as f:
-        f.write(js_content)
-    print("✅ Fixed frontend/app.js")
+    _report_write("frontend/app.js", js_content)
     
     print("\n🎉 System fixes applied successfully!")
     print("\n📋 Next steps:")
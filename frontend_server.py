@@ -4,9 +4,15 @@ FastAPI Frontend Server for InsurAgent
 Serves the frontend files with proper routing
 """
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.staticfiles import NotModifiedResponse
+from functools import lru_cache
+import hashlib
+import mimetypes
 import uvicorn
 import os
 
@@ -18,38 +24,59 @@ frontend_dir = "frontend"
 if not os.path.exists(frontend_dir):
     raise Exception(f"Frontend directory '{frontend_dir}' not found!")
 
-# Health check endpoint (define before catch-all)
+index_path = os.path.join(frontend_dir, "index.html")
+if not os.path.isfile(index_path):
+    raise Exception(f"index.html not found at {index_path}")
+
+# Files up to this size are served from memory (app.js and styles.css included)
+MEMORY_CACHE_MAX_BYTES = int(os.getenv("FRONTEND_CACHE_MAX_BYTES", str(256 * 1024)))
+ASSET_CACHE_CONTROL = "public, max-age=3600"
+
+@lru_cache(maxsize=64)
+def _cached_file(path, mtime_ns, size):
+    """(content, etag, media_type) of a small file; mtime and size key out edited files"""
+    with open(path, "rb") as f:
+        content = f.read()
+    etag = '"' + hashlib.md5(f"{mtime_ns}-{size}".encode()).hexdigest() + '"'
+    media_type = mimetypes.guess_type(path)[0] or "text/plain"
+    return content, etag, media_type
+
+class FrontendFiles(StaticFiles):
+    """StaticFiles that falls back to index.html and keeps small files in memory"""
+
+    async def get_response(self, path, scope):
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise
+            # Serve index.html for SPA routing (handles #demo, #demo-details, etc.)
+            return await super().get_response("index.html", scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        if stat_result.st_size > MEMORY_CACHE_MAX_BYTES:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        content, etag, media_type = _cached_file(str(full_path), stat_result.st_mtime_ns, stat_result.st_size)
+        # index.html is always revalidated so a new frontend shows up right away
+        cache_control = "no-cache" if media_type == "text/html" else ASSET_CACHE_CONTROL
+        response = Response(content, status_code=status_code, media_type=media_type,
+                            headers={"etag": etag, "cache-control": cache_control})
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+# Health check endpoint (define before the static mount)
 @app.get("/health")
 async def health():
     return {"status": "healthy", "service": "InsurAgent Frontend"}
 
-# Serve index.html at root
-@app.get("/")
-async def serve_index():
-    """Serve the main index.html file"""
-    index_path = os.path.join(frontend_dir, "index.html")
-    if not os.path.exists(index_path):
-        raise Exception(f"index.html not found at {index_path}")
-    return FileResponse(index_path)
-
-# Catch-all route to serve static files or index.html
-@app.get("/{full_path:path}")
-async def serve_files(full_path: str, request: Request):
-    """Serve static files or index.html for SPA routing"""
-    # Check if it's a request for a static file
-    static_file_path = os.path.join(frontend_dir, full_path)
-    
-    # If the file exists, serve it
-    if os.path.isfile(static_file_path):
-        return FileResponse(static_file_path)
-    
-    # Otherwise, serve index.html for SPA routing (handles #demo, #demo-details, etc.)
-    index_path = os.path.join(frontend_dir, "index.html")
-    return FileResponse(index_path)
+# Serve static files, index.html at root and for unknown paths
+app.mount("/", FrontendFiles(directory=frontend_dir, html=True), name="static")
 
 if __name__ == "__main__":
     print("🚀 Starting InsurAgent Frontend Server...")
     print(f"📁 Serving files from: {os.path.abspath(frontend_dir)}")
     print("🌐 Frontend will be available at: http://localhost:8080")
     print("📄 Root page: index.html")
-    uvicorn.run(app, host="0.0.0.0", port=8080, log_level="info") 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8080, log_level="info")
@@ -1,28 +1,42 @@
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import router
+from fastapi.responses import ORJSONResponse
+from app.api import router, lifespan
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Row-level verification logs are emitted at DEBUG, set LOG_LEVEL=DEBUG to see them
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+
 # Create FastAPI app
-app = FastAPI(title="InsurAgent API", description="API for insurance claim verification")
+app = FastAPI(title="InsurAgent API", description="API for insurance claim verification", lifespan=lifespan,
+              default_response_class=ORJSONResponse)
 
-# Add CORS middleware - Configured for development
+# Configure CORS for the frontend. An explicit origin list (no "*") lets the middleware
+# answer from a fixed set, and max_age lets browsers cache preflight responses for a day.
+# Override with a comma-separated CORS_ORIGINS.
+ALLOWED_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv(
+        "CORS_ORIGINS",
+        "http://localhost:8080,http://127.0.0.1:8080,http://localhost:3000,http://127.0.0.1:3000"
+    ).split(",")
+    if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:8080",
-        "http://127.0.0.1:8080", 
-        "http://localhost:3000",  # Common dev ports
-        "http://127.0.0.1:3000",
-        "*"  # Allow all origins for development
-    ],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["authorization", "content-type"],
+    max_age=86400,
 )
 
 # Include API router
@@ -35,4 +49,8 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    # uvicorn[standard] brings the uvloop event loop and the httptools parser, which
+    # uvicorn picks automatically. Caches and the OpenAI/Chroma clients are per
+    # process, so extra workers (WORKERS > 1, given the app as an import string)
+    # each warm up their own
+    uvicorn.run("main:app", host="127.0.0.1", port=8000, workers=int(os.getenv("WORKERS", "1")))
@@ -5,21 +5,39 @@ Minimal FastAPI server for testing connectivity
 
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import uvicorn
 import pandas as pd
-import io
+import orjson
+import asyncio
+import itertools
+import os
+import re
+import shutil
+import tempfile
 
 # Create FastAPI app
 app = FastAPI(title="InsurAgent API - Test", description="Minimal API for testing")
 
-# Add CORS middleware with explicit configuration
+# Add CORS middleware with the same explicit origins as the main API. Credentialed
+# "*" is rejected by browsers, and a fixed origin list is answered from a set.
+# Override with a comma-separated CORS_ORIGINS.
+ALLOWED_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv(
+        "CORS_ORIGINS",
+        "http://localhost:8080,http://127.0.0.1:8080,http://localhost:3000,http://127.0.0.1:3000"
+    ).split(",")
+    if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
-    expose_headers=["*"]
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["authorization", "content-type"],
+    max_age=86400,
 )
 
 @app.get("/")
@@ -54,120 +72,189 @@ async def verify_case_simple(case: dict):
         "clinical_flags": []
     }
 
+# Map your CSV columns to expected format
+COLUMN_MAPPING = {
+    'chief_complaints': 'complaint',
+    'symptoms': 'symptoms', 
+    'diagnosis_description': 'diagnosis',
+    'service_detail': 'lab',
+    'payer_product_category_name': 'pharmacy'
+}
+
+# Rows parsed per pandas chunk, so only one chunk of the upload is in memory at a time
+CSV_CHUNK_SIZE = 1024
+
+# Trigger terms of the test exclusion rules, per field
+SYMPTOM_EXCLUSION_TERMS = ("fatigue",)
+LAB_EXCLUSION_TERMS = ("eye examination",)
+
+def _terms_pattern(terms):
+    """One case-insensitive alternation matching any of terms, longest first"""
+    return re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+
+# Compiled once, so each cell is scanned a single time however many terms a field has
+_SYMPTOM_EXCLUSION_RE = _terms_pattern(SYMPTOM_EXCLUSION_TERMS)
+_LAB_EXCLUSION_RE = _terms_pattern(LAB_EXCLUSION_TERMS)
+
+def _read_csv_chunks(csv_file):
+    """Yield (chunk, symptoms_excluded, lab_excluded) for each chunk of a CSV path or file object"""
+    with pd.read_csv(
+        csv_file,
+        chunksize=CSV_CHUNK_SIZE,
+        usecols=lambda column: column in COLUMN_MAPPING,
+        dtype=str,
+        na_filter=False,  # Empty cells stay ""
+        encoding='utf-8'
+    ) as reader:
+        for chunk_number, chunk in enumerate(reader):
+            if chunk_number == 0:
+                print(f"CSV columns: {list(chunk.columns)}")
+            # Missing columns become empty values, then rename to the expected fields
+            chunk = chunk.reindex(columns=list(COLUMN_MAPPING), fill_value="").rename(columns=COLUMN_MAPPING)
+            
+            # Create some test exclusions, for the whole chunk at once
+            symptoms_excluded = chunk['symptoms'].str.contains(_SYMPTOM_EXCLUSION_RE)
+            lab_excluded = chunk['lab'].str.contains(_LAB_EXCLUSION_RE)
+            yield chunk, symptoms_excluded, lab_excluded
+
+def _iter_csv_results(chunks):
+    """Yield the verification result JSON of each row of chunks from _read_csv_chunks"""
+    case_number = 0
+    for chunk, symptoms_excluded, lab_excluded in chunks:
+        # tolist() converts each column to Python objects once, instead of boxing a
+        # numpy scalar per cell while iterating the Series
+        for complaint, symptoms, diagnosis, lab, pharmacy, symptom_hit, lab_hit in zip(
+            chunk['complaint'].tolist(), chunk['symptoms'].tolist(), chunk['diagnosis'].tolist(),
+            chunk['lab'].tolist(), chunk['pharmacy'].tolist(),
+            symptoms_excluded.tolist(), lab_excluded.tolist()
+        ):
+            case_number += 1
+            yield _case_json(case_number, complaint, symptoms, diagnosis, lab, pharmacy, symptom_hit, lab_hit)
+    
+    print(f"CSV rows processed: {case_number}")
+
+# Field explanations of the test rules. The submitted value is already in each
+# field's "value", so the explanations are constants instead of per-row f-strings
+_COMPLAINT_ALLOWED = "Complaint is covered"
+_SYMPTOMS_ALLOWED = "Symptoms are valid"
+_SYMPTOMS_EXCLUDED = "Symptoms contain excluded term 'fatigue'"
+_DIAGNOSIS_ALLOWED = "Diagnosis is covered"
+_LAB_ALLOWED = "Lab test is approved"
+_LAB_EXCLUDED = "Lab test 'eye examination' is excluded for sight correction"
+_PHARMACY_ALLOWED = "Medication is covered"
+
+def _field_json(result, explanation, policy_source="Main Policy"):
+    """JSON members after "value" of one field, pre-rendered"""
+    return orjson.dumps({"result": result, "explanation": explanation, "policy_source": policy_source})[1:-1]
+
+_SYMPTOMS_FLAG = {
+    "flagged_field": "symptoms",
+    "flagged_item": "fatigue",
+    "recommendations": [
+        "Consider alternative symptom description",
+        "Request additional medical documentation",
+        "Review with medical team"
+    ]
+}
+
+# JSON of one case result. Everything but the case number and the submitted
+# values is pre-rendered per rule outcome; values are escaped with orjson.dumps
+_CASE_TEMPLATE = (
+    b'{"case_id":"CASE-%d","result":{"final_decision":%s,"approval_probability":%d,"field_breakdown":{'
+    b'"complaint":{"field":"complaint","value":%s,' + _field_json("Allowed", _COMPLAINT_ALLOWED) + b'},'
+    b'"symptoms":{"field":"symptoms","value":%s,%s},'
+    b'"diagnosis":{"field":"diagnosis","value":%s,' + _field_json("Allowed", _DIAGNOSIS_ALLOWED) + b'},'
+    b'"lab":{"field":"lab","value":%s,%s},'
+    b'"pharmacy":{"field":"pharmacy","value":%s,' + _field_json("Allowed", _PHARMACY_ALLOWED) + b'}'
+    b'},"clinical_flags":%s}}'
+)
+
+# Pre-rendered parts, indexed by whether the field was excluded
+_SYMPTOMS_JSON = (_field_json("Allowed", _SYMPTOMS_ALLOWED), _field_json("Excluded", _SYMPTOMS_EXCLUDED))
+_LAB_JSON = (_field_json("Allowed", _LAB_ALLOWED), _field_json("Excluded", _LAB_EXCLUDED, "Sub Policy"))
+_FLAGS_JSON = (b'[]', orjson.dumps([_SYMPTOMS_FLAG]))
+_DECISION_JSON = ((b'"Allowed"', 85), (b'"Excluded"', 60))
+
+def _case_json(case_number, complaint, symptoms, diagnosis, lab, pharmacy, symptoms_excluded, lab_excluded):
+    """Test verification result of one CSV row, as JSON bytes"""
+    decision, approval_prob = _DECISION_JSON[symptoms_excluded or lab_excluded]
+    dumps = orjson.dumps
+    return _CASE_TEMPLATE % (
+        case_number, decision, approval_prob,
+        dumps(complaint),
+        dumps(symptoms), _SYMPTOMS_JSON[symptoms_excluded],
+        dumps(diagnosis),
+        dumps(lab), _LAB_JSON[lab_excluded],
+        dumps(pharmacy),
+        _FLAGS_JSON[symptoms_excluded]
+    )
+
+def _open_upload(upload_file):
+    """
+    Copy an upload to a temporary CSV file and parse its first chunk.
+    Returns (csv_path, chunks, first_chunk); first_chunk is None for an empty CSV.
+    """
+    tmp = tempfile.NamedTemporaryFile("wb", suffix=".csv", delete=False)
+    csv_path = tmp.name
+    try:
+        with tmp:
+            shutil.copyfileobj(upload_file, tmp, 1024 * 1024)
+    except Exception:
+        os.unlink(csv_path)
+        raise
+    chunks = _read_csv_chunks(csv_path)
+    try:
+        first_chunk = next(chunks, None)
+    except Exception:
+        _remove_upload(csv_path, chunks)
+        raise
+    return csv_path, chunks, first_chunk
+
+def _remove_upload(csv_path, chunks):
+    """Close the CSV reader and delete the temporary copy; safe to call more than once"""
+    try:
+        chunks.close()
+    except ValueError:
+        pass  # Still being iterated in the response's thread, which closes it itself
+    try:
+        os.unlink(csv_path)
+    except OSError:
+        pass  # Already removed
+
 @app.post("/verify-csv")
 async def verify_csv_simple(file: UploadFile = File(...)):
-    """Process CSV file and return verification results"""
+    """Process CSV file and stream the verification results as they are built"""
+    # FastAPI closes the upload once this handler returns, so the streamed response
+    # parses its own copy, one chunk at a time. The copy and the first chunk are made
+    # in a worker thread, off the event loop; parsing the first chunk here means a
+    # malformed CSV still gets a 400
     try:
-        # Read the uploaded file
-        contents = await file.read()
-        
-        # Parse CSV
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-        
-        print(f"CSV columns: {list(df.columns)}")
-        print(f"CSV shape: {df.shape}")
-        print(f"First few rows:\n{df.head()}")
-        
-        # Map your CSV columns to expected format
-        column_mapping = {
-            'chief_complaints': 'complaint',
-            'symptoms': 'symptoms', 
-            'diagnosis_description': 'diagnosis',
-            'service_detail': 'lab',
-            'payer_product_category_name': 'pharmacy'
-        }
-        
-        results = []
-        
-        for index, row in df.iterrows():
-            # Map the columns
-            mapped_data = {}
-            for csv_col, expected_col in column_mapping.items():
-                if csv_col in df.columns:
-                    mapped_data[expected_col] = str(row[csv_col]) if pd.notna(row[csv_col]) else ""
-                else:
-                    mapped_data[expected_col] = ""
-            
-            # Determine decisions based on content for testing
-            symptoms_text = mapped_data.get('symptoms', '').lower()
-            lab_text = mapped_data.get('lab', '').lower()
-            
-            # Create some test exclusions
-            symptoms_excluded = 'fatigue' in symptoms_text
-            lab_excluded = 'eye examination' in lab_text
-            
-            final_decision = "Excluded" if (symptoms_excluded or lab_excluded) else "Allowed"
-            approval_prob = 60 if final_decision == "Excluded" else 85
-            
-            # Create clinical flags for excluded items
-            clinical_flags = []
-            if symptoms_excluded:
-                clinical_flags.append({
-                    "flagged_field": "symptoms",
-                    "flagged_item": "fatigue",
-                    "recommendations": [
-                        "Consider alternative symptom description",
-                        "Request additional medical documentation",
-                        "Review with medical team"
-                    ]
-                })
-            
-            # Create result for this row
-            result = {
-                "case_id": f"CASE-{index + 1}",
-                "result": {
-                    "final_decision": final_decision,
-                    "approval_probability": approval_prob,
-                    "field_breakdown": {
-                        "complaint": {
-                            "field": "complaint",
-                            "value": mapped_data.get('complaint', ''),
-                            "result": "Allowed", 
-                            "explanation": f"Complaint '{mapped_data.get('complaint', '')}' is covered",
-                            "policy_source": "Main Policy"
-                        },
-                        "symptoms": {
-                            "field": "symptoms",
-                            "value": mapped_data.get('symptoms', ''),
-                            "result": "Excluded" if symptoms_excluded else "Allowed", 
-                            "explanation": f"Symptoms contain excluded term 'fatigue'" if symptoms_excluded else f"Symptoms '{mapped_data.get('symptoms', '')}' are valid",
-                            "policy_source": "Main Policy"
-                        },
-                        "diagnosis": {
-                            "field": "diagnosis",
-                            "value": mapped_data.get('diagnosis', ''),
-                            "result": "Allowed", 
-                            "explanation": f"Diagnosis '{mapped_data.get('diagnosis', '')}' is covered",
-                            "policy_source": "Main Policy"
-                        },
-                        "lab": {
-                            "field": "lab",
-                            "value": mapped_data.get('lab', ''),
-                            "result": "Excluded" if lab_excluded else "Allowed", 
-                            "explanation": f"Lab test 'eye examination' is excluded for sight correction" if lab_excluded else f"Lab test '{mapped_data.get('lab', '')}' is approved",
-                            "policy_source": "Sub Policy" if lab_excluded else "Main Policy"
-                        },
-                        "pharmacy": {
-                            "field": "pharmacy",
-                            "value": mapped_data.get('pharmacy', ''),
-                            "result": "Allowed", 
-                            "explanation": f"Medication '{mapped_data.get('pharmacy', '')}' is covered",
-                            "policy_source": "Main Policy"
-                        }
-                    },
-                    "clinical_flags": clinical_flags
-                }
-            }
-            results.append(result)
-        
-        return {
-            "results": results,
-            "total_processed": len(results)
-        }
-        
+        csv_path, chunks, first_chunk = await asyncio.to_thread(_open_upload, file.file)
     except Exception as e:
         print(f"Error processing CSV: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error processing CSV: {str(e)}")
+    
+    def _generate():
+        # Same {"results": [...], "total_processed": n} body, written one case at a time
+        try:
+            yield b'{"results":['
+            total = 0
+            parsed = chunks if first_chunk is None else itertools.chain([first_chunk], chunks)
+            for result in _iter_csv_results(parsed):
+                yield (b',' if total else b'') + result
+                total += 1
+            yield b'],"total_processed":%d}' % total
+        except Exception as e:
+            # Headers are already sent; aborting the stream leaves the client an invalid body
+            print(f"Error processing CSV: {str(e)}")
+            raise
+        finally:
+            _remove_upload(csv_path, chunks)
+    
+    # The background task also removes the copy when the body was never iterated
+    # (e.g. the client went away before it started)
+    return StreamingResponse(_generate(), media_type="application/json",
+                             background=BackgroundTask(_remove_upload, csv_path, chunks))
 
 if __name__ == "__main__":
     print("Starting minimal InsurAgent API server...")